@@ -13,34 +13,63 @@ import argparse
 import json
 import sqlite3
 import sys
+from collections import defaultdict
 from pathlib import Path
 
+from output import write_json_array
 
-def fetch_function(conn: sqlite3.Connection, usr: str) -> dict | None:
-    row = conn.execute(
-        "SELECT d.fully_qualified_name, s.text "
-        "FROM def d JOIN source s USING (usr) WHERE d.usr = ?",
-        (usr,),
-    ).fetchone()
-    if row is None:
-        return None
-
-    fqn, text = row
-
-    callees = [
-        r[0]
-        for r in conn.execute(
-            "SELECT callee_usr FROM call WHERE caller_usr = ?", (usr,)
-        )
-    ]
-
-    return {
-        "usr": usr,
-        "fully_qualified_name": fqn,
-        "text": text,
-        "call": callees,
+
+# The USR list is bound as one JSON array parameter, so each statement's text
+# is constant: the sqlite3 statement cache reuses one prepared statement
+# whatever the number of USRs, and SQLite's host-parameter limit never applies.
+_DEF_SQL = (
+    "SELECT d.usr, d.fully_qualified_name, s.text "
+    "FROM def d JOIN source s USING (usr) "
+    "WHERE d.usr IN (SELECT value FROM json_each(?))"
+)
+_CALL_SQL = (
+    "SELECT caller_usr, callee_usr FROM call "
+    "WHERE caller_usr IN (SELECT value FROM json_each(?))"
+)
+
+
+def fetch_functions(conn: sqlite3.Connection,
+                    usrs: list[str]) -> list[dict | None]:
+    """Fetch details for every USR with two queries in total.
+
+    Returns one entry per input USR, in input order; None where the USR is
+    not in the database.
+    """
+    usr_list = json.dumps(usrs)
+    cur = conn.cursor()
+
+    defs = {
+        usr: (fqn, text)
+        for usr, fqn, text in cur.execute(_DEF_SQL, (usr_list,))
     }
 
+    callees: dict[str, list[str]] = defaultdict(list)
+    for caller, callee in cur.execute(_CALL_SQL, (usr_list,)):
+        callees[caller].append(callee)
+
+    results: list[dict | None] = []
+    for usr in usrs:
+        if usr not in defs:
+            results.append(None)
+            continue
+        fqn, text = defs[usr]
+        results.append({
+            "usr": usr,
+            "fully_qualified_name": fqn,
+            "text": text,
+            "call": callees.get(usr, []),
+        })
+    return results
+
+
+def fetch_function(conn: sqlite3.Connection, usr: str) -> dict | None:
+    return fetch_functions(conn, [usr])[0]
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(
@@ -51,20 +80,18 @@ def main() -> int:
     args = parser.parse_args()
 
     conn = sqlite3.connect(args.database)
+    conn.execute("PRAGMA mmap_size=268435456")
+
+    results = fetch_functions(conn, args.usrs)
+    conn.close()
 
-    results = []
     ok = True
-    for usr in args.usrs:
-        item = fetch_function(conn, usr)
+    for usr, item in zip(args.usrs, results):
         if item is None:
             print(f"warning: USR not found: {usr}", file=sys.stderr)
             ok = False
-        else:
-            results.append(item)
-
-    conn.close()
 
-    print(json.dumps(results, indent=2))
+    write_json_array(item for item in results if item is not None)
     return 0 if ok else 1
 
 
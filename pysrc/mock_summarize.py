@@ -11,22 +11,37 @@ where size is the number of characters in the source text.
 """
 
 import argparse
-import re
 import sqlite3
 import sys
 
-from summary import summary_update
+from summary import Prompt, summary_update
+
+_FENCE_OPEN  = "```cpp\n"
+_FENCE_CLOSE = "\n```"
 
 
 def _mock(prompt: str) -> str:
+    if isinstance(prompt, Prompt):
+        return (f"{prompt.fqn} is a great function "
+                f"and has size of {len(prompt.text)}")
+
+    # Plain string: recover the fields from the prompt text with literal
+    # str searches rather than regexes.
     # First line: "Summarize the following C++ function or method `{fqn}`."
-    first_line = prompt.split("\n")[0]
-    m = re.search(r"`([^`]+)`", first_line)
-    fqn = m.group(1) if m else "unknown"
+    first_line = prompt.partition("\n")[0]
+    _, tick, rest = first_line.partition("`")
+    fqn, tick, _ = rest.partition("`") if tick else ("", "", "")
+    if not (tick and fqn):
+        fqn = "unknown"
 
     # Source text is between the ```cpp and ``` fences.
-    m = re.search(r"```cpp\n(.*?)\n```", prompt, re.DOTALL)
-    size = len(m.group(1)) if m else 0
+    size = 0
+    start = prompt.find(_FENCE_OPEN)
+    if start >= 0:
+        start += len(_FENCE_OPEN)
+        end = prompt.find(_FENCE_CLOSE, start)
+        if end >= 0:
+            size = end - start
 
     return f"{fqn} is a great function and has size of {size}"
 
@@ -39,8 +54,7 @@ def main() -> int:
                         help="Re-summarize even if a summary already exists")
     args = parser.parse_args()
 
-    conn = sqlite3.connect(args.database)
-    conn.execute("PRAGMA journal_mode=WAL")
+    conn = sqlite3.connect(args.database, cached_statements=256)
     summary_update(conn, _mock, force=args.force)
     conn.close()
     return 0
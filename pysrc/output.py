@@ -0,0 +1,45 @@
+"""
+JSON output shared by the crux-cpp query scripts (fetch.py, topo.py).
+
+orjson is used when it is installed; otherwise the stdlib json module
+produces the same indented layout.
+"""
+
+import json
+import sys
+from collections.abc import Iterable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# json.dumps() builds a fresh JSONEncoder whenever it is given options such
+# as indent; write_json_array() encodes once per element, so share one.
+_json_encoder = json.JSONEncoder(indent=2)
+
+
+def _encode(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return _json_encoder.encode(obj).encode("utf-8")
+
+
+def write_json_array(items: Iterable[object]) -> None:
+    """Write items to stdout as a JSON array indented by two spaces.
+
+    Elements are encoded and written one at a time, so neither the whole
+    list nor its encoded form has to be held in memory, and readers see
+    output as soon as each element is ready.
+    """
+    sys.stdout.flush()
+    out = sys.stdout.buffer
+    sep = b"[\n  "
+    for item in items:
+        out.write(sep)
+        # JSON strings never contain raw newlines, so this only re-indents.
+        out.write(_encode(item).replace(b"\n", b"\n  "))
+        sep = b",\n  "
+    out.write(b"[]\n" if sep == b"[\n  " else b"\n]\n")
+    out.flush()
@@ -6,96 +6,468 @@ Core API
 summary_update(conn, summarize, force=False)
     Populate the 'summary' table in an open SQLite connection by calling
     `summarize(prompt) -> str` for each in-root function in topological
-    (callee-first) order.
+    (callee-first) order.  Each prompt is a Prompt: a str that also exposes
+    the function's .fqn and source .text.  A coroutine function is also
+    accepted and is run through summary_update_async.
+
+summary_update_async(conn, summarize, force=False, concurrency=8)
+    Same, awaiting an async `summarize`; independent SCCs (one layer of
+    the condensed call DAG) are summarized concurrently.
+
+summary_update_batched(conn, summarize_batch, batch_size=32, force=False)
+    Same, calling `summarize_batch(prompts) -> list[str]` with up to
+    `batch_size` prompts of one layer at a time, e.g. for a self-hosted
+    engine with continuous batching or an offline batch API.
 
 Helpers exported for use in CLI wrappers
 ----------------------------------------
 tarjan_sccs(graph)   -- iterative Tarjan SCC, callee-first order
+tarjan_csr(...)      -- same, on integer node ids in CSR form
+call_graph_csr(...)  -- read the 'call' table in CSR form
 build_prompt(...)    -- build the LLM prompt for one function
+Prompt               -- str subclass returned by build_prompt
 """
 
+import asyncio
+import inspect
+import itertools
 import sqlite3
-from collections.abc import Callable
+from array import array
+from collections.abc import Awaitable, Callable, Iterator
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 
 # ── Tarjan SCC (iterative) ────────────────────────────────────────────────────
 
-def tarjan_sccs(graph: dict[str, list[str]]) -> list[list[str]]:
-    """Return SCCs in topological order (callee-first) via iterative Tarjan."""
-    index_counter = [0]
-    stack: list[str] = []
-    on_stack: set[str] = set()
-    index: dict[str, int] = {}
-    lowlink: dict[str, int] = {}
-    sccs: list[list[str]] = []
-
-    for root in graph:
-        if root in index:
+UNVISITED = -1
+
+
+def tarjan_csr(indptr: array, indices: array) -> list[list[int]]:
+    """Integer fast path of tarjan_sccs, on a graph in CSR form.
+
+    Nodes are 0 .. len(indptr) - 2; node v has successors
+    indices[indptr[v]:indptr[v + 1]].  Returns SCCs of node ids in
+    topological order (callee-first).  Following the one-pass formulation
+    in Tarjan & Zwick's survey, a single state word per node replaces the
+    separate index / lowlink / on-stack tables:
+
+      UNVISITED       node not reached yet
+      s >= 0          node is on the Tarjan stack; s is its lowlink, expressed
+                      as a position in that stack
+      s <= -2         node belongs to the finished SCC number -2 - s
+    """
+    n = len(indptr) - 1
+    state = array("i", [UNVISITED]) * n
+    stack: list[int] = []
+    sccs: list[list[int]] = []
+
+    # DFS frames as two parallel arrays: the node, and the position of its
+    # next unexplored edge in indices.  No per-frame tuple or iterator.
+    work_node = array("i")
+    work_edge = array("i")
+
+    for root in range(n):
+        if state[root] != UNVISITED:
             continue
-        index[root] = lowlink[root] = index_counter[0]
-        index_counter[0] += 1
+
+        state[root] = len(stack)
         stack.append(root)
-        on_stack.add(root)
-        work = [(root, iter(graph[root]))]
-
-        while work:
-            v, neighbours = work[-1]
-            try:
-                w = next(neighbours)
-                if w not in index:
-                    index[w] = lowlink[w] = index_counter[0]
-                    index_counter[0] += 1
+        work_node.append(root)
+        work_edge.append(indptr[root])
+
+        while work_node:
+            v = work_node[-1]
+            pos = work_edge[-1]
+            if pos < indptr[v + 1]:
+                work_edge[-1] = pos + 1
+                w = indices[pos]
+                s = state[w]
+                if s == UNVISITED:
+                    state[w] = len(stack)
                     stack.append(w)
-                    on_stack.add(w)
-                    work.append((w, iter(graph[w])))
-                elif w in on_stack:
-                    lowlink[v] = min(lowlink[v], index[w])
-            except StopIteration:
-                work.pop()
-                if work:
-                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[v])
-                if lowlink[v] == index[v]:
-                    scc: list[str] = []
-                    while True:
-                        w = stack.pop()
-                        on_stack.discard(w)
-                        scc.append(w)
-                        if w == v:
-                            break
-                    sccs.append(scc)
+                    work_node.append(w)
+                    work_edge.append(indptr[w])
+                elif 0 <= s < state[v]:
+                    state[v] = s
+                continue
+
+            work_node.pop()
+            work_edge.pop()
+            low = state[v]
+            # v keeps its own stack position as lowlink iff it is a root.
+            if stack[low] == v:
+                c = -2 - len(sccs)
+                members = stack[low:]
+                del stack[low:]
+                for w in members:
+                    state[w] = c
+                members.reverse()
+                sccs.append(members)
+            elif work_node:
+                parent = work_node[-1]
+                if low < state[parent]:
+                    state[parent] = low
 
     return sccs
 
 
+def tarjan_sccs(graph: dict[str, list[str]]) -> list[list[str]]:
+    """Return SCCs in topological order (callee-first) via iterative Tarjan."""
+    # Run on dense integer ids so the traversal never hashes a USR string.
+    nodes = list(graph)
+    node_id = {u: i for i, u in enumerate(nodes)}
+
+    indptr = array("i", [0])
+    indices = array("i")
+    for u in nodes:
+        indices.extend(node_id[w] for w in graph[u])
+        indptr.append(len(indices))
+
+    return [[nodes[v] for v in scc] for scc in tarjan_csr(indptr, indices)]
+
+
+def call_graph_csr(conn: sqlite3.Connection,
+                   usrs: list[str]) -> tuple[array, array]:
+    """Read the 'call' table as (indptr, indices) over node i = usrs[i].
+
+    'call' is scanned in table order and edges with an end outside usrs
+    (external callees) are dropped by the USR → node-id lookup.  The edges
+    are grouped by caller with a counting sort that keeps 'call' order
+    within each caller, so the result does not depend on the query plan.
+    """
+    node_id = {usr: i for i, usr in enumerate(usrs)}.get
+
+    callers = array("i")
+    callees = array("i")
+    for caller, callee in conn.execute(
+            "SELECT caller_usr, callee_usr FROM call"):
+        v = node_id(caller)
+        w = node_id(callee)
+        if v is not None and w is not None:
+            callers.append(v)
+            callees.append(w)
+
+    # Out-degrees, then their prefix sums: node v's edges go to
+    # indices[indptr[v]:indptr[v + 1]].
+    indptr = array("i", [0]) * (len(usrs) + 1)
+    for v in callers:
+        indptr[v + 1] += 1
+    for i in range(len(usrs)):
+        indptr[i + 1] += indptr[i]
+
+    indices = array("i", [0]) * len(callees)
+    next_slot = indptr[:-1]
+    for v, w in zip(callers, callees):
+        indices[next_slot[v]] = w
+        next_slot[v] += 1
+
+    return indptr, indices
+
+
 # ── Prompt builder ────────────────────────────────────────────────────────────
 
+class Prompt(str):
+    """Prompt text that also carries the function it was built for.
+
+    Behaves as a plain str for LLM clients; summarizers that only need the
+    function's name or source can read .fqn and .text instead of parsing.
+    """
+    fqn: str
+    text: str
+
+    def __new__(cls, prompt: str, fqn: str, text: str) -> "Prompt":
+        self = super().__new__(cls, prompt)
+        self.fqn = fqn
+        self.text = text
+        return self
+
+    def __getnewargs__(self) -> tuple[str, str, str]:
+        # copy and pickle rebuild a Prompt through __new__.
+        return (str(self), self.fqn, self.text)
+
+
 def build_prompt(fqn: str, text: str,
-                 callee_summaries: list[tuple[str, str]]) -> str:
-    lines = [
-        f"Summarize the following C++ function or method `{fqn}`.",
-        "",
-        "Source code:",
-        "```cpp",
-        text,
-        "```",
-    ]
-    if callee_summaries:
-        lines += ["", "Summaries of functions it calls:"]
-        for callee_fqn, summary in callee_summaries:
-            lines.append(f"- `{callee_fqn}`: {summary}")
-    lines += [
-        "",
+                 callee_summaries: list[tuple[str, str]]) -> Prompt:
+    callees = "".join(
+        f"\n- `{callee_fqn}`: {summary}"
+        for callee_fqn, summary in callee_summaries
+    )
+    if callees:
+        callees = f"\n\nSummaries of functions it calls:{callees}"
+    return Prompt(
+        f"Summarize the following C++ function or method `{fqn}`.\n"
+        "\n"
+        "Source code:\n"
+        "```cpp\n"
+        f"{text}\n"
+        "```"
+        f"{callees}\n"
+        "\n"
         "Write a concise one- or two-sentence summary describing what this "
         "function does.",
-    ]
-    return "\n".join(lines)
+        fqn, text)
 
 
 # ── Library entry point ───────────────────────────────────────────────────────
 
+# SQL used by the update functions.  _SELECT_TEXT_SQL runs once per
+# summarized function, always as the same string on `conn`, so its statement
+# cache serves the prepared form; _INSERT_SUMMARY_SQL runs once per written
+# batch, through _SummaryWriter's connection.
+_SELECT_SUMMARIES_SQL = \
+    "SELECT d.usr, d.fully_qualified_name, s.summary " \
+    "FROM def d JOIN summary s USING (usr)"
+_SELECT_TEXT_SQL      = "SELECT text FROM source WHERE usr = ?"
+_INSERT_SUMMARY_SQL   = \
+    "INSERT OR REPLACE INTO summary (usr, summary) VALUES (?, ?)"
+
+# Summaries written per executemany + commit.  Callee summaries are read from
+# memory, not back from the table, so batches span SCCs freely.
+WRITE_BATCH = 64
+
+
+def _load_functions(
+    conn: sqlite3.Connection,
+) -> tuple[list[str], list[str], array, array]:
+    """Create the 'summary' table and call-graph index if needed, and load
+    the in-root functions.
+
+    Returns (usrs, fqns, indptr, indices): function i is usrs[i], named
+    fqns[i], in 'def' order, and the call graph among them in CSR form
+    (see call_graph_csr).  Source texts are not loaded here; they are read
+    one at a time, when a prompt needs them.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""\
+        CREATE TABLE IF NOT EXISTS summary (
+            usr     TEXT  PRIMARY KEY  REFERENCES def(usr),
+            summary TEXT  NOT NULL
+        )""")
+    # Databases loaded before load.py created it lack this index.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_call_callee ON call(callee_usr)")
+    conn.commit()
+
+    # In-root functions, in 'def' order so the SCC order does not depend on
+    # the query plan.
+    usrs: list[str] = []
+    fqns: list[str] = []
+    for usr, fqn in conn.execute(
+        "SELECT d.usr, d.fully_qualified_name "
+        "FROM def d JOIN source s USING (usr) ORDER BY d.rowid"
+    ):
+        usrs.append(usr)
+        fqns.append(fqn)
+
+    indptr, indices = call_graph_csr(conn, usrs)
+    return usrs, fqns, indptr, indices
+
+
+def _database_file(conn: sqlite3.Connection) -> str:
+    """Path of conn's main database; '' if it is in-memory or temporary."""
+    for _, name, file in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return file
+    return ""
+
+
+class _SummaryWriter:
+    """Writes batches of (usr, summary) rows, each with one commit.
+
+    For a file database the batches go to a single worker thread with its
+    own connection, so a commit's fsync overlaps the next LLM request
+    instead of stalling the caller.  An in-memory database cannot be opened
+    twice, so its batches are written inline on `conn`.  A failed write is
+    raised from the next write() once noticed, or from close() at the end.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+        self._path = _database_file(conn)
+        self._executor = (ThreadPoolExecutor(max_workers=1)
+                          if self._path else None)
+        self._worker_conn: sqlite3.Connection | None = None
+        self._in_flight: deque[Future] = deque()
+
+    @staticmethod
+    def _commit(conn: sqlite3.Connection,
+                rows: list[tuple[str, str]]) -> None:
+        conn.executemany(_INSERT_SUMMARY_SQL, rows)
+        conn.commit()
+
+    def _commit_on_worker(self, rows: list[tuple[str, str]]) -> None:
+        if self._worker_conn is None:
+            self._worker_conn = sqlite3.connect(self._path)
+            self._worker_conn.execute("PRAGMA synchronous=NORMAL")
+        self._commit(self._worker_conn, rows)
+
+    def _close_on_worker(self) -> None:
+        if self._worker_conn is not None:
+            self._worker_conn.close()
+
+    def write(self, rows: list[tuple[str, str]]) -> None:
+        if self._executor is None:
+            self._commit(self._conn, rows)
+            return
+        while self._in_flight and self._in_flight[0].done():
+            self._in_flight.popleft().result()
+        self._in_flight.append(
+            self._executor.submit(self._commit_on_worker, rows))
+
+    def close(self) -> None:
+        """Wait for every queued write and release the worker."""
+        if self._executor is None:
+            return
+        try:
+            while self._in_flight:
+                self._in_flight.popleft().result()
+        finally:
+            self._executor.submit(self._close_on_worker)
+            self._executor.shutdown()
+
+
+def _scc_layers(sccs: list[list[int]], indptr: array,
+                indices: array) -> list[list[list[int]]]:
+    """Group callee-first SCCs into layers of the condensed call DAG.
+
+    An SCC's layer is one more than the deepest layer among the SCCs it
+    calls, so every SCC in a layer depends only on earlier layers and the
+    members of one layer can be summarized together.  This is the layering
+    Kahn's algorithm produces; since tarjan_csr already yields the SCCs in
+    reverse topological order, one pass computes it without in-degrees.
+    """
+    scc_of = array("i", [0]) * (len(indptr) - 1)
+    level:  list[int] = []
+    layers: list[list[list[int]]] = []
+    for i, scc in enumerate(sccs):
+        for v in scc:
+            scc_of[v] = i
+        depth = 0
+        for v in scc:
+            for pos in range(indptr[v], indptr[v + 1]):
+                j = scc_of[indices[pos]]
+                if j != i and level[j] >= depth:
+                    depth = level[j] + 1
+        level.append(depth)
+        if depth == len(layers):
+            layers.append([])
+        layers[depth].append(scc)
+    return layers
+
+
+def _scc_members(scc: list[int], indptr: array,
+                 indices: array) -> set[int] | None:
+    """Return the set of scc's members, or None for a trivial SCC (a single
+    function that does not call itself), which needs no intra-SCC filter."""
+    if len(scc) == 1:
+        v = scc[0]
+        if v not in indices[indptr[v]:indptr[v + 1]]:
+            return None
+    return set(scc)
+
+
+class _UpdateRun:
+    """State shared by one run of summary_update, summary_update_async or
+    summary_update_batched, so the three entry points cannot drift apart.
+
+    Loads the in-root functions and their call graph, the summaries made so
+    far, and the SCCs; builds prompts and records results; owns the cursor
+    and the _SummaryWriter, which is closed on leaving the `with` block.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, force: bool) -> None:
+        self.usrs, self.fqns, self.indptr, self.indices = \
+            _load_functions(conn)
+        self.force = force
+        self.cur = conn.cursor()
+        # usr → (fully_qualified_name, summary) for every summary so far,
+        # kept current as new summaries are produced, so neither the skip
+        # check nor callee lookups have to query the database, and a
+        # callee's prompt entry is a single dict lookup.
+        self.summary_of: dict[str, tuple[str, str]] = {
+            usr: (fqn, summary)
+            for usr, fqn, summary in self.cur.execute(_SELECT_SUMMARIES_SQL)}
+        self.sccs = tarjan_csr(self.indptr, self.indices)
+        self.total = len(self.usrs)
+        self.done = 0     # progress count: members visited so far
+        self.writer = _SummaryWriter(conn)
+
+    def __enter__(self) -> "_UpdateRun":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.writer.close()
+
+    def layers(self) -> list[list[list[int]]]:
+        return _scc_layers(self.sccs, self.indptr, self.indices)
+
+    def _callee_summaries(self, v: int,
+                          scc_set: set[int] | None) -> list[tuple[str, str]]:
+        """Collect (fqn, summary) of v's callees processed in earlier SCCs."""
+        usrs, summary_of = self.usrs, self.summary_of
+        callees = self.indices[self.indptr[v]:self.indptr[v + 1]]
+        if scc_set is None:
+            return [
+                summary_of[usrs[w]]
+                for w in callees
+                if usrs[w] in summary_of
+            ]
+        return [
+            summary_of[usrs[w]]
+            for w in callees
+            # Same SCC: mutual recursion — no summary yet.
+            if w not in scc_set and usrs[w] in summary_of
+        ]
+
+    def scc_prompts(self, scc: list[int]) -> list[tuple[int, str, Prompt]]:
+        """Build the prompt of every member of scc that needs a summary.
+
+        Members of one SCC never see each other's summaries, so every
+        prompt can be built before the first LLM call.  Texts are read one
+        at a time as the prompts are built.  Members skipped as already
+        summarized are reported here.
+
+        Returns (progress number, usr, prompt) per member to summarize.
+        """
+        scc_set = _scc_members(scc, self.indptr, self.indices)
+        todo: list[tuple[int, str, Prompt]] = []
+        for v in scc:
+            self.done += 1
+            usr = self.usrs[v]
+            fqn = self.fqns[v]
+
+            if not self.force and usr in self.summary_of:
+                print(f"[{self.done}/{self.total}] "
+                      f"skip (already summarized): {fqn}")
+                continue
+
+            callee_summaries = self._callee_summaries(v, scc_set)
+            text = self.cur.execute(_SELECT_TEXT_SQL, (usr,)).fetchone()[0]
+            todo.append((self.done, usr,
+                         build_prompt(fqn, text, callee_summaries)))
+        return todo
+
+    def layer_prompts(
+        self, layer: list[list[int]],
+    ) -> Iterator[tuple[int, str, Prompt]]:
+        """scc_prompts() over every SCC of a layer, built one SCC at a time
+        as the caller consumes them, so a layer's texts are never all in
+        memory."""
+        for scc in layer:
+            yield from self.scc_prompts(scc)
+
+    def summarized(self, n: int, usr: str, prompt: Prompt,
+                   result: str) -> None:
+        """Record a new summary for later callers and report it."""
+        self.summary_of[usr] = (prompt.fqn, result)
+        print(f"[{n}/{self.total}] summarized: {prompt.fqn}")
+
+
 def summary_update(
     conn: sqlite3.Connection,
-    summarize: Callable[[str], str],
+    summarize: Callable[[str], str] | Callable[[str], Awaitable[str]],
     force: bool = False,
 ) -> None:
     """Populate the 'summary' table using the provided summarize function.
@@ -104,66 +476,119 @@ def summary_update(
     ----------
     conn:       Open SQLite connection to a crux-cpp database.
     summarize:  Callable that takes a prompt string and returns a summary.
+                If it is a coroutine function, this runs
+                summary_update_async() on a new event loop.
     force:      If True, re-summarize functions that already have a summary.
     """
-    conn.execute("""\
-        CREATE TABLE IF NOT EXISTS summary (
-            usr     TEXT  PRIMARY KEY  REFERENCES def(usr),
-            summary TEXT  NOT NULL
-        )""")
-    conn.commit()
+    if inspect.iscoroutinefunction(summarize):
+        asyncio.run(summary_update_async(conn, summarize, force=force))
+        return
+
+    with _UpdateRun(conn, force) as run:
+        # Summaries not yet written.  Flushed (one executemany + one commit)
+        # every WRITE_BATCH results and at the end, on the writer's thread
+        # when there is one.
+        pending: list[tuple[str, str]] = []
+
+        def flush() -> None:
+            if pending:
+                run.writer.write(pending.copy())
+                pending.clear()
+
+        try:
+            for scc in run.sccs:
+                for n, usr, prompt in run.scc_prompts(scc):
+                    result = summarize(prompt)
+
+                    pending.append((usr, result))
+                    if len(pending) >= WRITE_BATCH:
+                        flush()
+                    run.summarized(n, usr, prompt, result)
+        finally:
+            # Keep what was already summarized even if summarize() raised.
+            flush()
+
+
+async def summary_update_async(
+    conn: sqlite3.Connection,
+    summarize: Callable[[str], Awaitable[str]],
+    force: bool = False,
+    concurrency: int = 8,
+) -> None:
+    """Like summary_update(), for a coroutine summarize function.
 
-    # Load all in-root functions: usr → (fully_qualified_name, text).
-    rows = conn.execute(
-        "SELECT d.usr, d.fully_qualified_name, s.text "
-        "FROM def d JOIN source s USING (usr)"
-    ).fetchall()
-    names: dict[str, str] = {usr: fqn  for usr, fqn, _    in rows}
-    texts: dict[str, str] = {usr: text for usr, _,   text in rows}
-
-    # Build call graph restricted to in-root functions.
-    graph: dict[str, list[str]] = {usr: [] for usr in names}
-    for caller, callee in conn.execute("SELECT caller_usr, callee_usr FROM call"):
-        if caller in names and callee in names:
-            graph[caller].append(callee)
-
-    sccs  = tarjan_sccs(graph)
-    total = sum(len(s) for s in sccs)
-    done  = 0
-
-    for scc in sccs:
-        scc_set = set(scc)
-
-        for usr in scc:
-            done += 1
-            fqn  = names[usr]
-
-            if not force:
-                if conn.execute(
-                    "SELECT 1 FROM summary WHERE usr = ?", (usr,)
-                ).fetchone():
-                    print(f"[{done}/{total}] skip (already summarized): {fqn}")
-                    continue
-
-            # Collect summaries of callees processed in earlier SCCs.
-            callee_summaries: list[tuple[str, str]] = []
-            for callee_usr in graph[usr]:
-                if callee_usr in scc_set:
-                    continue  # mutual recursion — no summary yet
-                row = conn.execute(
-                    "SELECT d.fully_qualified_name, s.summary "
-                    "FROM def d JOIN summary s USING (usr) WHERE d.usr = ?",
-                    (callee_usr,),
-                ).fetchone()
-                if row:
-                    callee_summaries.append(row)
-
-            prompt = build_prompt(fqn, texts[usr], callee_summaries)
-            result = summarize(prompt)
-
-            conn.execute(
-                "INSERT OR REPLACE INTO summary (usr, summary) VALUES (?, ?)",
-                (usr, result),
-            )
-            conn.commit()
-            print(f"[{done}/{total}] summarized: {fqn}")
+    SCCs are grouped into layers of the condensed call DAG (_scc_layers):
+    every SCC in a layer calls only SCCs of earlier layers, and members of
+    one SCC do not see each other's summaries, so the prompts of a layer can
+    be sent together.  They are built and sent in windows of WRITE_BATCH,
+    with at most `concurrency` requests in flight, and each window's results
+    are written with one executemany + commit once it finishes.  If a
+    request fails, the rest of its window is still written before the error
+    is raised.
+
+    As in summary_update(), the writes of a file database run on a worker
+    thread, so a commit's fsync overlaps the next window's requests instead
+    of blocking the event loop.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(prompt: Prompt) -> str:
+        async with semaphore:
+            return await summarize(prompt)
+
+    with _UpdateRun(conn, force) as run:
+        for layer in run.layers():
+            for window in itertools.batched(run.layer_prompts(layer),
+                                            WRITE_BATCH):
+                results = await asyncio.gather(
+                    *(bounded(prompt) for _, _, prompt in window),
+                    return_exceptions=True)
+
+                # Keep the window's successes even if some request failed.
+                written: list[tuple[str, str]] = []
+                for (n, usr, prompt), result in zip(window, results):
+                    if isinstance(result, BaseException):
+                        continue
+                    written.append((usr, result))
+                    run.summarized(n, usr, prompt, result)
+                if written:
+                    run.writer.write(written)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+
+
+def summary_update_batched(
+    conn: sqlite3.Connection,
+    summarize_batch: Callable[[list[Prompt]], list[str]],
+    batch_size: int = 32,
+    force: bool = False,
+) -> None:
+    """Like summary_update(), for a summarizer that takes many prompts.
+
+    SCCs are grouped into layers of the condensed call DAG as in
+    summary_update_async(), and each layer's prompts are passed to
+    `summarize_batch` in chunks of at most `batch_size`.  It must return one
+    summary per prompt, in order.  For example, with vLLM:
+
+        llm = vllm.LLM(model=...)
+        def summarize_batch(prompts):
+            return [o.outputs[0].text for o in llm.generate(prompts)]
+
+    Prompts are built as the batches need them, and each batch's results
+    are written with one executemany + commit as soon as it returns.
+    """
+    with _UpdateRun(conn, force) as run:
+        for layer in run.layers():
+            for batch in itertools.batched(run.layer_prompts(layer),
+                                           batch_size):
+                results = summarize_batch([prompt for _, _, prompt in batch])
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"summarize_batch returned {len(results)} summaries "
+                        f"for {len(batch)} prompts")
+                run.writer.write(
+                    [(usr, result)
+                     for (_, usr, _), result in zip(batch, results)])
+                for (n, usr, prompt), result in zip(batch, results):
+                    run.summarized(n, usr, prompt, result)
@@ -8,96 +8,148 @@ The outer array is ordered so that callees appear before their callers
 
 Only functions present in the 'def' table are included; calls to external
 functions (e.g. stdlib) are ignored.
+
+With --cache, the call graph is kept in <database>.topo-cache and reused by
+later runs until the database changes.
 """
 
 import argparse
+import contextlib
 import json
+import os
 import sqlite3
 import sys
-from collections import defaultdict
+from array import array
+from pathlib import Path
+
+from output import write_json_array
+# tarjan_sccs is re-exported for callers that still import it from here.
+from summary import call_graph_csr, tarjan_csr, tarjan_sccs
 
 
-def tarjan_sccs(graph: dict[str, list[str]]) -> list[list[str]]:
-    """Return SCCs in topological order (callee-first) via iterative Tarjan.
+def load_graph(conn: sqlite3.Connection) -> tuple[list[str], array, array]:
+    """Load the in-root call graph as (usrs, indptr, indices).
 
-    Each SCC is a list of node keys.  The algorithm is iterative to avoid
-    hitting Python's recursion limit on deep call graphs.
+    Node i is usrs[i], numbered in 'def' rowid order; the edges come from
+    call_graph_csr(), which drops external callees and keeps 'call' order.
     """
-    index_counter = [0]
-    stack: list[str] = []
-    on_stack: set[str] = set()
-    index: dict[str, int] = {}
-    lowlink: dict[str, int] = {}
-    sccs: list[list[str]] = []
-
-    for root in graph:
-        if root in index:
+    usrs = [usr for usr, in conn.execute("SELECT usr FROM def ORDER BY rowid")]
+    indptr, indices = call_graph_csr(conn, usrs)
+    return usrs, indptr, indices
+
+
+def _db_stamp(database: Path) -> tuple[int, ...]:
+    """(mtime_ns, size) of the database file and of its WAL, if present."""
+    stamp: list[int] = []
+    for path in (database, database.with_name(database.name + "-wal")):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
             continue
+        stamp += [st.st_mtime_ns, st.st_size]
+    return tuple(stamp)
+
+
+def _read_cache(
+    cache: Path, stamp: tuple[int, ...],
+) -> tuple[list[str], array, array] | None:
+    """Return the graph stored in cache if it was built for stamp, else None.
 
-        index[root] = lowlink[root] = index_counter[0]
-        index_counter[0] += 1
-        stack.append(root)
-        on_stack.add(root)
-        # Each frame: (node, iterator over its neighbours)
-        work = [(root, iter(graph[root]))]
-
-        while work:
-            v, neighbours = work[-1]
-            try:
-                w = next(neighbours)
-                if w not in index:
-                    index[w] = lowlink[w] = index_counter[0]
-                    index_counter[0] += 1
-                    stack.append(w)
-                    on_stack.add(w)
-                    work.append((w, iter(graph[w])))
-                elif w in on_stack:
-                    lowlink[v] = min(lowlink[v], index[w])
-            except StopIteration:
-                work.pop()
-                if work:
-                    parent = work[-1][0]
-                    lowlink[parent] = min(lowlink[parent], lowlink[v])
-                if lowlink[v] == index[v]:
-                    scc: list[str] = []
-                    while True:
-                        w = stack.pop()
-                        on_stack.discard(w)
-                        scc.append(w)
-                        if w == v:
-                            break
-                    sccs.append(scc)
-
-    return sccs
+    The file is one JSON header line (stamp, usrs, array sizes), then the
+    raw indptr and indices arrays.  A missing, stale, truncated or otherwise
+    malformed file yields None.
+    """
+    try:
+        with open(cache, "rb") as f:
+            header = json.loads(f.readline())
+            if (not isinstance(header, dict)
+                    or header.get("stamp") != list(stamp)
+                    or header.get("itemsize") != array("i").itemsize
+                    or header.get("byteorder") != sys.byteorder):
+                return None
+            usrs = header["usrs"]
+            indptr = array("i")
+            indptr.fromfile(f, len(usrs) + 1)
+            indices = array("i")
+            indices.fromfile(f, header["edges"])
+            if f.read(1) or indptr[-1] != len(indices):
+                return None
+    except (OSError, EOFError, ValueError, KeyError, TypeError):
+        return None
+    if not all(isinstance(usr, str) for usr in usrs):
+        return None
+    return usrs, indptr, indices
+
+
+def _write_cache(cache: Path, stamp: tuple[int, ...],
+                 graph: tuple[list[str], array, array]) -> None:
+    """Store graph in cache for _read_cache(); warn instead of failing."""
+    usrs, indptr, indices = graph
+    header = {"stamp": list(stamp), "itemsize": indptr.itemsize,
+              "byteorder": sys.byteorder, "edges": len(indices),
+              "usrs": usrs}
+    tmp = cache.with_name(cache.name + ".tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            indptr.tofile(f)
+            indices.tofile(f)
+        os.replace(tmp, cache)
+    except OSError as exc:
+        print(f"warning: cannot write cache: {exc}", file=sys.stderr)
+        with contextlib.suppress(OSError):
+            tmp.unlink(missing_ok=True)
+
+
+def load_graph_cached(database: Path) -> tuple[list[str], array, array]:
+    """Like load_graph(), but reuse a sidecar cache while the database is
+    unchanged.
+
+    The graph is stored in <database>.topo-cache together with the
+    database's modification time and size; a cache that is stale or cannot
+    be read is rebuilt and overwritten.  The stamp is taken before the graph
+    is read and the cache is only written if the database did not change
+    meanwhile.  Failing to write the cache only prints a warning.
+    """
+    cache = database.with_name(database.name + ".topo-cache")
+    stamp = _db_stamp(database)
+    graph = _read_cache(cache, stamp)
+    if graph is not None:
+        return graph
+
+    conn = sqlite3.connect(database)
+    graph = load_graph(conn)
+    conn.close()
+
+    # A write that committed while the graph was read would leave it stored
+    # under a stamp it does not match; then it is returned but not cached.
+    if _db_stamp(database) == stamp:
+        _write_cache(cache, stamp, graph)
+    return graph
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Print call-graph functions in topological order.")
-    parser.add_argument("database", help="SQLite3 database file")
+    parser.add_argument("database", type=Path, help="SQLite3 database file")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse the call graph cached next to the "
+                             "database by a previous --cache run, if the "
+                             "database has not changed since")
     args = parser.parse_args()
 
-    conn = sqlite3.connect(args.database)
-
-    # Load fully_qualified_name keyed by USR.
-    names: dict[str, str] = dict(
-        conn.execute("SELECT usr, fully_qualified_name FROM def"))
-
-    # Build directed graph (caller -> callee), restricted to in-root functions.
-    graph: dict[str, list[str]] = {usr: [] for usr in names}
-    for caller, callee in conn.execute("SELECT caller_usr, callee_usr FROM call"):
-        if caller in names and callee in names:
-            graph[caller].append(callee)
-
-    conn.close()
-
-    sccs = tarjan_sccs(graph)
+    if args.cache:
+        usrs, indptr, indices = load_graph_cached(args.database)
+    else:
+        conn = sqlite3.connect(args.database)
+        usrs, indptr, indices = load_graph(conn)
+        conn.close()
 
-    # Replace USRs with human-readable names.
-    # result = [[names[u] for u in scc] for scc in sccs]
-    result = sccs
+    sccs = tarjan_csr(indptr, indices)
 
-    print(json.dumps(result, indent=2))
+    # Replace ids with USRs (or names[usrs[v]] for human-readable names),
+    # one SCC at a time as it is written out.
+    write_json_array([usrs[v] for v in scc] for scc in sccs)
     return 0
 
 
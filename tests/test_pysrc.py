@@ -1,24 +1,35 @@
 """
 Tests for the Python modules in pysrc/:
-  summary.py  – tarjan_sccs, build_prompt, summary_update
-  topo.py     – tarjan_sccs  (independent copy; same algorithm)
+  summary.py  – tarjan_sccs, build_prompt, Prompt, summary_update,
+                summary_update_async, summary_update_batched
+  topo.py     – load_graph, load_graph_cached (tarjan_sccs is summary's)
   mock_summarize.py – _mock
   load.py     – read_source_text, load_def_csv, load_csv
-  fetch.py    – fetch_function
+  fetch.py    – fetch_function, fetch_functions
+  output.py   – write_json_array
 """
 
+import asyncio
+import copy
 import csv
+import json
+import pickle
 import re
 import sqlite3
+from array import array
 
 import pytest
 
+import load as load_mod
+import output as output_mod
 import summary as summary_mod
 import topo as topo_mod
-from fetch import fetch_function
+from fetch import fetch_function, fetch_functions
 from load import load_csv, load_def_csv, read_source_text
 from mock_summarize import _mock
-from summary import build_prompt, summary_update, tarjan_sccs
+from summary import (Prompt, build_prompt, summary_update,
+                     summary_update_async, summary_update_batched,
+                     tarjan_sccs)
 
 
 # ── Fixtures ──────────────────────────────────────────────────────────────────
@@ -127,12 +138,21 @@ class TestTarjanSccs:
         assert sccs.index(cycle_scc) < sccs.index(tail_scc)
 
 
-# ── tarjan_sccs in topo.py is an independent copy; spot-check it ──────────────
+    def test_integer_fast_path(self):
+        # 0→1→2→1, 3 isolated
+        sccs = summary_mod.tarjan_csr(array("i", [0, 1, 2, 3, 3]),
+                                      array("i", [1, 2, 1]))
+        assert sorted(map(sorted, sccs)) == [[0], [1, 2], [3]]
+        assert sccs.index([0]) > next(
+            i for i, s in enumerate(sccs) if len(s) == 2)
+
+
+# ── tarjan_sccs in topo.py is re-exported from summary.py ─────────────────────
 
 class TestTarjanSccsTopo:
     def test_same_behaviour_as_summary(self):
-        graph = {"a": ["b"], "b": ["c"], "c": []}
-        assert topo_mod.tarjan_sccs(graph) == summary_mod.tarjan_sccs(graph)
+        assert topo_mod.tarjan_sccs is summary_mod.tarjan_sccs
+        assert topo_mod.tarjan_csr is summary_mod.tarjan_csr
 
     def test_cycle(self):
         graph = {"p": ["q"], "q": ["p"]}
@@ -140,10 +160,158 @@ class TestTarjanSccsTopo:
         assert len(sccs) == 1
         assert set(sccs[0]) == {"p", "q"}
 
+    def test_nested_cycles_and_self_loop(self):
+        # {a,b,c} cycle with a chord, {d} self-loop called from c, e isolated
+        graph = {"a": ["b"], "b": ["c", "a"], "c": ["a", "d"],
+                 "d": ["d"], "e": []}
+        sccs = topo_mod.tarjan_sccs(graph)
+        assert sccs == summary_mod.tarjan_sccs(graph)
+        assert sorted(map(sorted, sccs)) == [["a", "b", "c"], ["d"], ["e"]]
+        assert sccs.index(["d"]) < next(
+            i for i, s in enumerate(sccs) if len(s) == 3)
+
+
+# ── load_graph / tarjan_csr (topo.py) ─────────────────────────────────────────
+
+class TestLoadGraph:
+    def test_external_callees_dropped(self, db):
+        insert_func(db, "u1", "foo")
+        insert_func(db, "u2", "bar")
+        db.execute("INSERT INTO call VALUES ('u1', 'u2')")
+        db.execute("INSERT INTO call VALUES ('u1', 'ext_usr')")
+        db.commit()
+        usrs, indptr, indices = topo_mod.load_graph(db)
+        assert usrs == ["u1", "u2"]
+        assert list(indptr) == [0, 1, 1]
+        assert list(indices) == [1]
+
+    def test_sccs_match_dict_graph(self, db):
+        for u in ["a", "b", "c"]:
+            insert_func(db, u, u)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("a", "b"), ("b", "a"), ("b", "c")])
+        db.commit()
+        usrs, indptr, indices = topo_mod.load_graph(db)
+        sccs = [[usrs[v] for v in s]
+                for s in topo_mod.tarjan_csr(indptr, indices)]
+        assert sccs == topo_mod.tarjan_sccs(
+            {"a": ["b"], "b": ["a", "c"], "c": []})
+
+    def test_nodes_in_insertion_order(self, db):
+        for u in ["z", "a", "m", "b"]:
+            insert_func(db, u, u)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("z", "a"), ("m", "b")])
+        db.commit()
+        usrs, indptr, indices = topo_mod.load_graph(db)
+        assert usrs == ["z", "a", "m", "b"]
+        assert [[usrs[v] for v in s]
+                for s in topo_mod.tarjan_csr(indptr, indices)] == [
+            ["a"], ["z"], ["b"], ["m"]]
+
+    def test_sparse_rowids(self, db):
+        insert_func(db, "u1", "foo")
+        db.execute("INSERT INTO def (rowid, usr, fully_qualified_name, kind,"
+                   " class, visibility)"
+                   " VALUES (1000000000, 'u2', 'bar', 'Function', '', '')")
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("u2", "u1"), ("u1", "u2"), ("u2", "u2")])
+        db.commit()
+        usrs, indptr, indices = topo_mod.load_graph(db)
+        graph = {usrs[v]: sorted(usrs[w]
+                                 for w in indices[indptr[v]:indptr[v + 1]])
+                 for v in range(len(usrs))}
+        assert graph == {"u1": ["u2"], "u2": ["u1", "u2"]}
+
+
+class TestLoadGraphCached:
+    def _make_db(self, path):
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        insert_func(conn, "u1", "foo")
+        insert_func(conn, "u2", "bar")
+        conn.execute("INSERT INTO call VALUES ('u1', 'u2')")
+        conn.commit()
+        return conn
+
+    def test_second_run_uses_cache(self, tmp_path, monkeypatch):
+        db_path = tmp_path / "crux.db"
+        self._make_db(db_path).close()
+        first = topo_mod.load_graph_cached(db_path)
+        assert (tmp_path / "crux.db.topo-cache").exists()
+
+        monkeypatch.setattr(topo_mod, "load_graph",
+                            lambda conn: pytest.fail("cache not used"))
+        assert topo_mod.load_graph_cached(db_path) == first
+
+    def test_rebuilt_after_database_changes(self, tmp_path):
+        db_path = tmp_path / "crux.db"
+        conn = self._make_db(db_path)
+        usrs, _, _ = topo_mod.load_graph_cached(db_path)
+        assert usrs == ["u1", "u2"]
+
+        insert_func(conn, "u3", "baz")
+        conn.close()
+        usrs, indptr, indices = topo_mod.load_graph_cached(db_path)
+        assert usrs == ["u1", "u2", "u3"]
+        assert list(indptr) == [0, 1, 1, 1]
+        assert list(indices) == [1]
+
+    @pytest.mark.parametrize("content", [
+        b"", b"not json\n", b"[1, 2]\n", pickle.dumps(("stamp", "graph"))])
+    def test_malformed_cache_rebuilt(self, tmp_path, content):
+        db_path = tmp_path / "crux.db"
+        self._make_db(db_path).close()
+        (tmp_path / "crux.db.topo-cache").write_bytes(content)
+        usrs, indptr, indices = topo_mod.load_graph_cached(db_path)
+        assert usrs == ["u1", "u2"]
+        assert list(indices) == [1]
+        assert topo_mod.load_graph_cached(db_path) == (usrs, indptr, indices)
+
+    def test_truncated_cache_rebuilt(self, tmp_path):
+        db_path = tmp_path / "crux.db"
+        self._make_db(db_path).close()
+        first = topo_mod.load_graph_cached(db_path)
+        cache = tmp_path / "crux.db.topo-cache"
+        cache.write_bytes(cache.read_bytes()[:-2])
+        assert topo_mod.load_graph_cached(db_path) == first
+
+    def test_not_cached_if_database_changes_while_loading(self, tmp_path,
+                                                          monkeypatch):
+        db_path = tmp_path / "crux.db"
+        self._make_db(db_path).close()
+        real_load_graph = topo_mod.load_graph
+        def load_then_write(conn):
+            graph = real_load_graph(conn)
+            writer = sqlite3.connect(db_path)
+            insert_func(writer, "u3", "baz")
+            writer.close()
+            return graph
+        monkeypatch.setattr(topo_mod, "load_graph", load_then_write)
+        usrs, _, _ = topo_mod.load_graph_cached(db_path)
+        assert usrs == ["u1", "u2"]
+        assert not (tmp_path / "crux.db.topo-cache").exists()
+
+    def test_unwritable_cache_warns(self, tmp_path, capsys):
+        db_path = tmp_path / "crux.db"
+        self._make_db(db_path).close()
+        (tmp_path / "crux.db.topo-cache.tmp").mkdir()
+        usrs, _, _ = topo_mod.load_graph_cached(db_path)
+        assert usrs == ["u1", "u2"]
+        assert "warning: cannot write cache" in capsys.readouterr().err
+
 
 # ── build_prompt ──────────────────────────────────────────────────────────────
 
 class TestBuildPrompt:
+    def test_prompt_survives_copy_and_pickle(self):
+        prompt = build_prompt("f", "code", [("g", "does g")])
+        for clone in (copy.copy(prompt), copy.deepcopy(prompt),
+                      pickle.loads(pickle.dumps(prompt))):
+            assert isinstance(clone, Prompt)
+            assert clone == prompt
+            assert (clone.fqn, clone.text) == ("f", "code")
+
     def test_first_line_contains_fqn(self):
         prompt = build_prompt("MyNS::foo", "int x;", [])
         first = prompt.split("\n")[0]
@@ -167,6 +335,11 @@ class TestBuildPrompt:
         assert "- `g`: sum1" in prompt
         assert "- `h`: sum2" in prompt
 
+    def test_returns_prompt_with_fields(self):
+        prompt = build_prompt("ns::f", "int x;", [])
+        assert isinstance(prompt, Prompt)
+        assert (prompt.fqn, prompt.text) == ("ns::f", "int x;")
+
     def test_fqn_parseable_by_mock(self):
         """_mock must be able to extract the FQN from the prompt first line."""
         fqn = "Outer::Inner::method"
@@ -199,6 +372,20 @@ class TestMock:
         result = _mock(prompt)
         assert result.startswith("Pair<int>::swap is a great function")
 
+    def test_uses_prompt_fields(self):
+        prompt = Prompt("no fences here", "ns::foo", "int x = 1;")
+        assert _mock(prompt) == "ns::foo is a great function and has size of 10"
+
+    def test_plain_string_without_fences(self):
+        assert _mock("no fqn and no code") == \
+            "unknown is a great function and has size of 0"
+
+    def test_plain_string_prompt_parsed(self):
+        src = "int foo() {\n    return 1;\n}"
+        prompt = str(build_prompt("foo", src, [("g", "s")]))
+        assert type(prompt) is str
+        assert _mock(prompt) == f"foo is a great function and has size of {len(src)}"
+
 
 # ── summary_update ────────────────────────────────────────────────────────────
 
@@ -209,6 +396,20 @@ class TestSummaryUpdate:
         tables = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
         assert "summary" in tables
 
+    def test_source_without_def_ignored(self, db):
+        insert_func(db, "u1", "foo")
+        db.execute("INSERT INTO source VALUES ('orphan', 'f.cpp', 1, 1, 'x')")
+        db.execute("INSERT INTO call VALUES ('u1', 'orphan')")
+        db.commit()
+        summary_update(db, lambda p: "s")
+        assert dict(db.execute("SELECT usr, summary FROM summary")) == {
+            "u1": "s"}
+
+    def test_creates_callee_index(self, db):
+        summary_update(db, lambda p: "s")
+        indexes = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert "idx_call_callee" in indexes
+
     def test_writes_summary(self, db):
         insert_func(db, "u1", "foo")
         summary_update(db, lambda p: "great function")
@@ -278,6 +479,298 @@ class TestSummaryUpdate:
         summary_update(db, lambda p: "s")
         assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 1
 
+    def test_force_prompt_sees_new_callee_summary(self, db):
+        insert_func(db, "callee", "leaf")
+        insert_func(db, "caller", "root")
+        db.execute("INSERT INTO call VALUES ('caller', 'callee')")
+        db.commit()
+        summary_update(db, lambda p: "old")
+
+        prompts = {}
+        def mock(prompt):
+            prompts[prompt.fqn] = prompt
+            return f"new {prompt.fqn}"
+
+        summary_update(db, mock, force=True)
+        assert "- `leaf`: new leaf" in prompts["root"]
+
+    def test_self_recursive_function_excludes_own_summary(self, db):
+        insert_func(db, "u1", "fact")
+        db.execute("INSERT INTO call VALUES ('u1', 'u1')")
+        db.commit()
+        summary_update(db, lambda p: "old")
+
+        prompts = []
+        summary_update(db, lambda p: prompts.append(p) or "new", force=True)
+        assert "Summaries of functions it calls:" not in prompts[0]
+
+    def test_commits_batched_across_sccs(self, db, monkeypatch):
+        monkeypatch.setattr(summary_mod, "WRITE_BATCH", 16)
+        n = 50
+        for i in range(n):
+            insert_func(db, f"u{i}", f"f{i}")
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [(f"u{i}", f"u{i + 1}") for i in range(n - 1)])
+        db.commit()
+        statements = []
+        db.set_trace_callback(statements.append)
+        summary_update(db, lambda p: "s")
+        assert statements.count("COMMIT") == 4
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == n
+
+    def test_large_scc_flushed_in_batches(self, db, monkeypatch):
+        monkeypatch.setattr(summary_mod, "WRITE_BATCH", 2)
+        for usr in ["a", "b", "c"]:
+            insert_func(db, usr, usr)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("a", "b"), ("b", "c"), ("c", "a")])
+        db.commit()
+        statements = []
+        db.set_trace_callback(statements.append)
+        summary_update(db, lambda p: "s")
+        assert statements.count("COMMIT") == 2
+
+    def test_finished_summaries_kept_on_error(self, db):
+        for usr in ["a", "b", "c"]:
+            insert_func(db, usr, usr)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("a", "b"), ("b", "c"), ("c", "a")])
+        db.commit()
+
+        calls = 0
+        def mock(prompt):
+            nonlocal calls
+            calls += 1
+            if calls == 3:
+                raise RuntimeError("LLM down")
+            return "s"
+
+        with pytest.raises(RuntimeError):
+            summary_update(db, mock)
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 2
+
+    def test_file_database_written_by_worker(self, tmp_path):
+        conn = sqlite3.connect(tmp_path / "crux.db")
+        conn.executescript(SCHEMA)
+        insert_func(conn, "callee", "leaf")
+        insert_func(conn, "caller", "root")
+        conn.execute("INSERT INTO call VALUES ('caller', 'callee')")
+        conn.commit()
+        statements = []
+        conn.set_trace_callback(statements.append)
+
+        prompts = {}
+        def mock(prompt):
+            prompts[prompt.fqn] = prompt
+            return f"summary of {prompt.fqn}"
+
+        summary_update(conn, mock)
+        assert "summary of leaf" in prompts["root"]
+        assert not any(s.startswith("INSERT") for s in statements)
+        assert dict(conn.execute("SELECT usr, summary FROM summary")) == {
+            "callee": "summary of leaf", "caller": "summary of root"}
+        conn.close()
+
+
+# ── summary_update_async ──────────────────────────────────────────────────────
+
+class TestSummaryUpdateAsync:
+    def test_coroutine_summarizer_via_summary_update(self, db):
+        insert_func(db, "callee", "leaf")
+        insert_func(db, "caller", "root")
+        db.execute("INSERT INTO call VALUES ('caller', 'callee')")
+        db.commit()
+
+        async def mock(prompt):
+            return f"summary of {prompt.fqn}"
+
+        summary_update(db, mock)
+        assert dict(db.execute("SELECT usr, summary FROM summary")) == {
+            "callee": "summary of leaf", "caller": "summary of root"}
+
+    def test_scc_members_run_concurrently(self, db):
+        for usr in ["a", "b", "c"]:
+            insert_func(db, usr, usr)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("a", "b"), ("b", "c"), ("c", "a")])
+        db.commit()
+
+        in_flight, peak = 0, 0
+        async def mock(prompt):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return "s"
+
+        asyncio.run(summary_update_async(db, mock, concurrency=2))
+        assert peak == 2
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 3
+
+    def test_independent_sccs_run_concurrently(self, db):
+        for usr in ["leaf1", "leaf2", "root"]:
+            insert_func(db, usr, usr)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("root", "leaf1"), ("root", "leaf2")])
+        db.commit()
+
+        in_flight, peak, order = 0, 0, []
+        async def mock(prompt):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            order.append(prompt.fqn)
+            return f"summary of {prompt.fqn}"
+
+        asyncio.run(summary_update_async(db, mock))
+        assert peak == 2
+        assert order[-1] == "root"
+
+    def test_failed_request_keeps_other_results(self, db):
+        for i in range(10):
+            insert_func(db, f"u{i}", f"f{i}")
+
+        async def mock(prompt):
+            if prompt.fqn == "f9":
+                raise RuntimeError("LLM down")
+            return "s"
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(summary_update_async(db, mock))
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 9
+
+    def test_layer_sent_in_windows(self, db, monkeypatch):
+        monkeypatch.setattr(summary_mod, "WRITE_BATCH", 3)
+        for i in range(7):
+            insert_func(db, f"u{i}", f"f{i}")
+        built = 0
+        real_build_prompt = summary_mod.build_prompt
+        def counting_build_prompt(*args):
+            nonlocal built
+            built += 1
+            return real_build_prompt(*args)
+        monkeypatch.setattr(summary_mod, "build_prompt", counting_build_prompt)
+        statements = []
+        db.set_trace_callback(statements.append)
+
+        seen = []
+        async def mock(prompt):
+            seen.append(built)
+            return "s"
+
+        asyncio.run(summary_update_async(db, mock))
+        assert seen == [3, 3, 3, 6, 6, 6, 7]
+        assert statements.count("COMMIT") == 3
+
+    def test_scc_layers(self):
+        graph = {"a": ["b", "c"], "b": ["c"], "c": [],
+                 "d": ["e"], "e": ["d", "c"]}
+        nodes = list(graph)
+        indptr, indices = array("i", [0]), array("i")
+        for u in nodes:
+            indices.extend(nodes.index(w) for w in graph[u])
+            indptr.append(len(indices))
+        layers = summary_mod._scc_layers(
+            summary_mod.tarjan_csr(indptr, indices), indptr, indices)
+        layers = [[[nodes[v] for v in scc] for scc in layer]
+                  for layer in layers]
+        assert [sorted(sorted(scc) for scc in layer) for layer in layers] == [
+            [["c"]], [["b"], ["d", "e"]], [["a"]]]
+
+    def test_callee_summary_included_in_prompt(self, db):
+        insert_func(db, "callee", "leaf")
+        insert_func(db, "caller", "root")
+        db.execute("INSERT INTO call VALUES ('caller', 'callee')")
+        db.commit()
+
+        prompts = {}
+        async def mock(prompt):
+            prompts[prompt.fqn] = prompt
+            return f"summary of {prompt.fqn}"
+
+        asyncio.run(summary_update_async(db, mock))
+        assert "summary of leaf" in prompts["root"]
+
+    def test_skips_existing(self, db):
+        insert_func(db, "u1", "foo")
+        summary_update(db, lambda p: "first")
+
+        async def mock(prompt):
+            pytest.fail("already summarized")
+
+        asyncio.run(summary_update_async(db, mock))
+        assert db.execute("SELECT summary FROM summary").fetchone()[0] == "first"
+
+    def test_file_database_written_off_loop(self, tmp_path):
+        conn = sqlite3.connect(tmp_path / "crux.db")
+        conn.executescript(SCHEMA)
+        insert_func(conn, "callee", "leaf")
+        insert_func(conn, "caller", "root")
+        conn.execute("INSERT INTO call VALUES ('caller', 'callee')")
+        conn.commit()
+
+        prompts = {}
+        async def mock(prompt):
+            prompts[prompt.fqn] = prompt
+            return f"summary of {prompt.fqn}"
+
+        asyncio.run(summary_update_async(conn, mock))
+        assert "summary of leaf" in prompts["root"]
+        assert dict(conn.execute("SELECT usr, summary FROM summary")) == {
+            "callee": "summary of leaf", "caller": "summary of root"}
+        conn.close()
+
+
+# ── summary_update_batched ────────────────────────────────────────────────────
+
+class TestSummaryUpdateBatched:
+    def test_layers_split_into_batches(self, db):
+        for usr in ["leaf1", "leaf2", "leaf3", "root"]:
+            insert_func(db, usr, usr)
+        db.executemany("INSERT INTO call VALUES (?, ?)",
+                       [("root", "leaf1"), ("root", "leaf2"),
+                        ("root", "leaf3")])
+        db.commit()
+
+        batches = []
+        def mock(prompts):
+            batches.append(sorted(p.fqn for p in prompts))
+            return [f"summary of {p.fqn}" for p in prompts]
+
+        summary_update_batched(db, mock, batch_size=2)
+        assert [len(b) for b in batches] == [2, 1, 1]
+        assert batches[-1] == ["root"]
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 4
+
+    def test_skips_existing(self, db):
+        insert_func(db, "u1", "foo")
+        summary_update(db, lambda p: "first")
+        summary_update_batched(db, lambda ps: pytest.fail("already summarized"))
+        assert db.execute("SELECT summary FROM summary").fetchone()[0] == "first"
+
+    def test_finished_batches_kept_on_error(self, db):
+        for i in range(10):
+            insert_func(db, f"u{i}", f"f{i}")
+
+        calls = 0
+        def mock(prompts):
+            nonlocal calls
+            calls += 1
+            if calls == 3:
+                raise RuntimeError("LLM down")
+            return ["s"] * len(prompts)
+
+        with pytest.raises(RuntimeError):
+            summary_update_batched(db, mock, batch_size=2)
+        assert db.execute("SELECT COUNT(*) FROM summary").fetchone()[0] == 4
+
+    def test_wrong_result_count_raises(self, db):
+        insert_func(db, "u1", "foo")
+        with pytest.raises(ValueError):
+            summary_update_batched(db, lambda ps: [])
 
 # ── read_source_text ──────────────────────────────────────────────────────────
 
@@ -324,6 +817,18 @@ class TestLoadDefCsv:
         text = conn.execute("SELECT text FROM source WHERE usr='u1'").fetchone()[0]
         assert text == "int foo() {\n    return 1;\n}"
 
+    def test_blank_and_short_rows(self, tmp_path):
+        (tmp_path / "f.cpp").write_text("int f(){}\n")
+        path = self._write_def_csv(tmp_path, [
+            ["u1", "f", "Function", "", "", "f.cpp", "1", "1"], [],
+            ["u2", "g", "Function", "", "", "f.cpp", "1", "1"]])
+        assert load_def_csv(self._make_db(), path, tmp_path) == 2
+
+        with open(path, "a", newline="") as f:
+            csv.writer(f).writerow(["u3", "h", "Function"])
+        with pytest.raises(ValueError, match="def.csv:5"):
+            load_def_csv(self._make_db(), path, tmp_path)
+
     def test_returns_row_count(self, tmp_path):
         for i in range(3):
             (tmp_path / f"f{i}.cpp").write_text("int f(){}\n")
@@ -342,6 +847,53 @@ class TestLoadDefCsv:
         load_def_csv(conn, path, tmp_path)  # should not raise
         assert "warning" in capsys.readouterr().err
 
+    def test_shared_file_read_once(self, tmp_path, monkeypatch):
+        (tmp_path / "f.cpp").write_text("int f(){}\nint g(){}\n")
+        path = self._write_def_csv(tmp_path, [
+            ["u1", "f", "Function", "", "", "f.cpp", "1", "1"],
+            ["u2", "g", "Function", "", "", "f.cpp", "2", "2"],
+        ])
+        reads = []
+        real_read_lines = load_mod.read_lines
+        monkeypatch.setattr(load_mod, "read_lines",
+                            lambda p: reads.append(p) or real_read_lines(p))
+        conn = self._make_db()
+        assert load_def_csv(conn, path, tmp_path) == 2
+        assert reads == [tmp_path / "f.cpp"]
+        assert dict(conn.execute("SELECT usr, text FROM source")) == {
+            "u1": "int f(){}", "u2": "int g(){}"}
+
+    def test_file_spanning_chunks_read_once(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(load_mod, "CHUNK_SIZE", 2)
+        (tmp_path / "f.cpp").write_text("a\nb\nc\n")
+        (tmp_path / "g.cpp").write_text("d\n")
+        path = self._write_def_csv(tmp_path, [
+            ["u1", "a", "Function", "", "", "f.cpp", "1", "1"],
+            ["u2", "b", "Function", "", "", "f.cpp", "2", "2"],
+            ["u3", "c", "Function", "", "", "f.cpp", "3", "3"],
+            ["u4", "d", "Function", "", "", "g.cpp", "1", "1"],
+        ])
+        reads = []
+        real_read_lines = load_mod.read_lines
+        monkeypatch.setattr(load_mod, "read_lines",
+                            lambda p: reads.append(p.name) or real_read_lines(p))
+        conn = self._make_db()
+        assert load_def_csv(conn, path, tmp_path) == 4
+        assert reads == ["f.cpp", "g.cpp"]
+        assert conn.execute(
+            "SELECT text FROM source WHERE usr='u3'").fetchone() == ("c",)
+
+    def test_error_rolls_back_whole_load(self, tmp_path):
+        (tmp_path / "f.cpp").write_text("int f(){}\n")
+        path = self._write_def_csv(tmp_path, [
+            ["u1", "f", "Function", "", "", "f.cpp", "1", "1"],
+            ["u2", "g", "Function", "", "", "f.cpp", "one", "1"],
+        ])
+        conn = self._make_db()
+        with pytest.raises(ValueError):
+            load_def_csv(conn, path, tmp_path)
+        assert conn.execute("SELECT COUNT(*) FROM def").fetchone()[0] == 0
+
 
 # ── load_csv (call / class tables) ───────────────────────────────────────────
 
@@ -362,6 +914,30 @@ class TestLoadCsv:
         assert count == 1
         assert conn.execute("SELECT * FROM call").fetchone() == ("u1", "u2")
 
+    def test_blank_lines_skipped(self, tmp_path):
+        path = tmp_path / "call.csv"
+        path.write_text("caller_usr,callee_usr\nu1,u2\n\nu3,u4\n")
+        conn = self._make_db()
+        assert load_csv(conn, path, "call") == 2
+
+    def test_short_row_raises(self, tmp_path):
+        path = tmp_path / "call.csv"
+        path.write_text("caller_usr,callee_usr\nu1,u2\nu3\n")
+        conn = self._make_db()
+        with pytest.raises(ValueError, match="call.csv:3"):
+            load_csv(conn, path, "call")
+        assert conn.execute("SELECT COUNT(*) FROM call").fetchone()[0] == 0
+
+    def test_joins_open_transaction(self, tmp_path):
+        path = tmp_path / "call.csv"
+        path.write_text("caller_usr,callee_usr\nu1,u2\n")
+        conn = self._make_db()
+        conn.execute("INSERT INTO call VALUES ('u0', 'u1')")
+        assert conn.in_transaction
+        assert load_csv(conn, path, "call") == 1
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM call").fetchone()[0] == 2
+
     def test_load_class(self, tmp_path):
         path = tmp_path / "class.csv"
         with open(path, "w", newline="") as f:
@@ -384,6 +960,33 @@ class TestLoadCsv:
         load_csv(conn, path, "call")
         assert conn.execute("SELECT COUNT(*) FROM call").fetchone()[0] == 1
 
+    def test_columns_matched_by_header(self, tmp_path):
+        path = tmp_path / "call.csv"
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["callee_usr", "extra", "caller_usr"])
+            w.writerow(["u2", "x", "u1"])
+        conn = self._make_db()
+        assert load_csv(conn, path, "call") == 1
+        assert conn.execute("SELECT * FROM call").fetchone() == ("u1", "u2")
+
+    def test_missing_column_raises(self, tmp_path):
+        path = tmp_path / "call.csv"
+        path.write_text("caller_usr\nu1\n")
+        conn = self._make_db()
+        with pytest.raises(ValueError, match="callee_usr"):
+            load_csv(conn, path, "call")
+
+    def test_many_rows(self, tmp_path):
+        path = tmp_path / "call.csv"
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["caller_usr", "callee_usr"])
+            w.writerows([["u1", f"v{i}"] for i in range(5)])
+        conn = self._make_db()
+        assert load_csv(conn, path, "call") == 5
+        assert conn.execute("SELECT COUNT(*) FROM call").fetchone()[0] == 5
+
 
 # ── fetch_function ────────────────────────────────────────────────────────────
 
@@ -425,3 +1028,46 @@ class TestFetchFunction:
         populated_db.commit()
         result = fetch_function(populated_db, "u1")
         assert set(result["call"]) == {"u2", "u3"}
+
+
+class TestFetchFunctions:
+    def test_preserves_input_order(self, populated_db):
+        results = fetch_functions(populated_db, ["u2", "u1"])
+        assert [r["usr"] for r in results] == ["u2", "u1"]
+        assert results[1]["call"] == ["u2"]
+
+    def test_missing_usr_is_none(self, populated_db):
+        results = fetch_functions(populated_db, ["u1", "nonexistent"])
+        assert results[0]["fully_qualified_name"] == "foo"
+        assert results[1] is None
+
+    def test_more_usrs_than_sqlite_parameters(self, populated_db):
+        usrs = ["u1"] + [f"missing{i}" for i in range(40_000)]
+        results = fetch_functions(populated_db, usrs)
+        assert len(results) == len(usrs)
+        assert results[0]["call"] == ["u2"]
+        assert results[-1] is None
+
+    def test_same_as_fetch_function(self, populated_db):
+        assert fetch_functions(populated_db, ["u1"]) == [
+            fetch_function(populated_db, "u1")]
+
+
+# ── write_json ────────────────────────────────────────────────────────────────
+
+class TestWriteJsonArray:
+    def test_stdlib_layout(self, capsys, monkeypatch):
+        monkeypatch.setattr(output_mod, "orjson", None)
+        obj = [{"usr": "u1", "call": ["u2"]}, ["a", "b"], "x"]
+        output_mod.write_json_array(iter(obj))
+        assert capsys.readouterr().out == json.dumps(obj, indent=2) + "\n"
+
+    def test_empty(self, capsys, monkeypatch):
+        monkeypatch.setattr(output_mod, "orjson", None)
+        output_mod.write_json_array([])
+        assert capsys.readouterr().out == "[]\n"
+
+    def test_round_trip(self, capsys):
+        obj = [["c"], ["b", "a"], {"text": "int f() {\n}\n"}]
+        output_mod.write_json_array(obj)
+        assert json.loads(capsys.readouterr().out) == obj